@@ -1,6 +1,6 @@
 """Builds on top of nodes.py to track brackets."""
 
-from collections.abc import Iterable, Sequence
+from collections.abc import Callable, Iterable, Sequence
 from dataclasses import dataclass, field
 from typing import Final, Optional, Union
 
@@ -25,6 +25,7 @@
 LeafID = int
 NodeType = int
 Priority = int
+DelimiterHandler = Callable[[Leaf, Optional[Leaf]], Priority]
 
 
 COMPREHENSION_PRIORITY: Final = 20
@@ -51,6 +52,21 @@
 }
 DOT_PRIORITY: Final = 1
 
+# What `BracketTracker.mark` needs to do for a given leaf type, looked up once
+# per leaf instead of testing membership in both bracket sets.
+_OTHER: Final = 0
+_OPENING: Final = 1
+_CLOSING: Final = 2
+_MARK_KIND: Final[dict[NodeType, int]] = {t: _OPENING for t in OPENING_BRACKETS}
+_MARK_KIND.update({t: _CLOSING for t in CLOSING_BRACKETS})
+
+_VARARG_PARENTS: Final = VARARGS_PARENTS | UNPACKING_PARENTS
+_DOT_EXCLUDED_PARENTS: Final = frozenset({syms.import_from, syms.dotted_name})
+_MATH_EXCLUDED_PARENTS: Final = frozenset({syms.factor, syms.star_expr})
+_COMP_FOR_PARENTS: Final = frozenset({syms.comp_for, syms.old_comp_for})
+_COMP_IF_PARENTS: Final = frozenset({syms.comp_if, syms.old_comp_if})
+_COMP_OP_PARENTS: Final = frozenset({syms.comp_op, syms.comparison})
+
 
 class BracketMatchError(Exception):
     """Raised when an opening bracket is unable to be matched to a closing bracket."""
@@ -89,20 +105,20 @@ def mark(self, leaf: Leaf) -> None:
         if leaf.type == token.COMMENT:
             return
 
-        if (
-            self.depth == 0
-            and leaf.type in CLOSING_BRACKETS
-            and (self.depth, leaf.type) not in self.bracket_match
-        ):
+        kind = _MARK_KIND.get(leaf.type, _OTHER)
+        bracket_match = self.bracket_match
+        if kind == _CLOSING and self.depth == 0 and (0, leaf.type) not in bracket_match:
             return
 
         self.maybe_decrement_after_for_loop_variable(leaf)
         self.maybe_decrement_after_lambda_arguments(leaf)
-        if leaf.type in CLOSING_BRACKETS:
-            self.depth -= 1
+        depth = self.depth
+        if kind == _CLOSING:
+            depth -= 1
             try:
-                opening_bracket = self.bracket_match.pop((self.depth, leaf.type))
+                opening_bracket = bracket_match.pop((depth, leaf.type))
             except KeyError as e:
+                self.depth = depth
                 raise BracketMatchError(
                     "Unable to match a closing bracket to the following opening"
                     f" bracket: {leaf}"
@@ -110,20 +126,22 @@ def mark(self, leaf: Leaf) -> None:
             leaf.opening_bracket = opening_bracket
             if not leaf.value:
                 self.invisible.append(leaf)
-        leaf.bracket_depth = self.depth
-        if self.depth == 0:
-            delim = is_split_before_delimiter(leaf, self.previous)
-            if delim and self.previous is not None:
-                self.delimiters[id(self.previous)] = delim
+        leaf.bracket_depth = depth
+        if depth == 0:
+            previous = self.previous
+            delim = is_split_before_delimiter(leaf, previous)
+            if delim and previous is not None:
+                self.delimiters[id(previous)] = delim
             else:
                 delim = is_split_after_delimiter(leaf)
                 if delim:
                     self.delimiters[id(leaf)] = delim
-        if leaf.type in OPENING_BRACKETS:
-            self.bracket_match[self.depth, BRACKET[leaf.type]] = leaf
-            self.depth += 1
+        if kind == _OPENING:
+            bracket_match[depth, BRACKET[leaf.type]] = leaf
+            depth += 1
             if not leaf.value:
                 self.invisible.append(leaf)
+        self.depth = depth
         self.previous = leaf
         self.maybe_increment_lambda_arguments(leaf)
         self.maybe_increment_for_loop_variable(leaf)
@@ -145,6 +163,9 @@ def max_delimiter_priority(self, exclude: Iterable[LeafID] = ()) -> Priority:
         Values are consistent with what `is_split_*_delimiter()` return.
         Raises ValueError on no delimiters.
         """
+        if not exclude:
+            return max(self.delimiters.values())
+
         return max(v for k, v in self.delimiters.items() if k not in exclude)
 
     def delimiter_count_with_priority(self, priority: Priority = 0) -> int:
@@ -156,7 +177,7 @@ def delimiter_count_with_priority(self, priority: Priority = 0) -> int:
             return 0
 
         priority = priority or self.max_delimiter_priority()
-        return sum(1 for p in self.delimiters.values() if p == priority)
+        return list(self.delimiters.values()).count(priority)
 
     def maybe_increment_for_loop_variable(self, leaf: Leaf) -> bool:
         """In a for loop, or comprehension, the variables are often unpacks.
@@ -238,68 +259,87 @@ def is_split_before_delimiter(leaf: Leaf, previous: Optional[Leaf] = None) -> Pr
 
     Higher numbers are higher priority.
     """
-    if is_vararg(leaf, within=VARARGS_PARENTS | UNPACKING_PARENTS):
-        # * and ** might also be MATH_OPERATORS but in this case they are not.
-        # Don't treat them as a delimiter.
+    handler = _BEFORE_DELIMITER_BY_TYPE.get(leaf.type)
+    if handler is None:
         return 0
 
+    return handler(leaf, previous)
+
+
+def _dot_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
     if (
-        leaf.type == token.DOT
-        and leaf.parent
-        and leaf.parent.type not in {syms.import_from, syms.dotted_name}
+        leaf.parent
+        and leaf.parent.type not in _DOT_EXCLUDED_PARENTS
         and (previous is None or previous.type in CLOSING_BRACKETS)
     ):
         return DOT_PRIORITY
 
-    if (
-        leaf.type in MATH_OPERATORS
-        and leaf.parent
-        and leaf.parent.type not in {syms.factor, syms.star_expr}
-    ):
+    return 0
+
+
+def _math_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    if is_vararg(leaf, within=_VARARG_PARENTS):
+        # * and ** might also be MATH_OPERATORS but in this case they are not.
+        # Don't treat them as a delimiter.
+        return 0
+
+    if leaf.parent and leaf.parent.type not in _MATH_EXCLUDED_PARENTS:
         return MATH_PRIORITIES[leaf.type]
 
-    if leaf.type in COMPARATORS:
-        return COMPARATOR_PRIORITY
+    return 0
 
-    if (
-        leaf.type == token.STRING
-        and previous is not None
-        and previous.type == token.STRING
-    ):
+
+def _comparator_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    return COMPARATOR_PRIORITY
+
+
+def _string_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    if previous is not None and previous.type == token.STRING:
         return STRING_PRIORITY
 
-    if leaf.type not in {token.NAME, token.ASYNC}:
+    return 0
+
+
+def _async_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    if not isinstance(leaf.prev_sibling, Leaf) or leaf.prev_sibling.value != "async":
+        return COMPREHENSION_PRIORITY
+
+    return 0
+
+
+def _name_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    handler = _BEFORE_DELIMITER_BY_NAME.get(leaf.value)
+    if handler is None:
         return 0
 
-    if (
-        leaf.value == "for"
-        and leaf.parent
-        and leaf.parent.type in {syms.comp_for, syms.old_comp_for}
-        or leaf.type == token.ASYNC
-    ):
-        if (
-            not isinstance(leaf.prev_sibling, Leaf)
-            or leaf.prev_sibling.value != "async"
-        ):
-            return COMPREHENSION_PRIORITY
+    return handler(leaf, previous)
 
-    if (
-        leaf.value == "if"
-        and leaf.parent
-        and leaf.parent.type in {syms.comp_if, syms.old_comp_if}
-    ):
+
+def _for_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    if leaf.parent and leaf.parent.type in _COMP_FOR_PARENTS:
+        return _async_priority(leaf, previous)
+
+    return 0
+
+
+def _if_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    if leaf.parent and leaf.parent.type in _COMP_IF_PARENTS:
         return COMPREHENSION_PRIORITY
 
-    if leaf.value in {"if", "else"} and leaf.parent and leaf.parent.type == syms.test:
+    return _else_priority(leaf, previous)
+
+
+def _else_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    if leaf.parent and leaf.parent.type == syms.test:
         return TERNARY_PRIORITY
 
-    if leaf.value == "is":
-        return COMPARATOR_PRIORITY
+    return 0
+
 
+def _in_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
     if (
-        leaf.value == "in"
-        and leaf.parent
-        and leaf.parent.type in {syms.comp_op, syms.comparison}
+        leaf.parent
+        and leaf.parent.type in _COMP_OP_PARENTS
         and not (
             previous is not None
             and previous.type == token.NAME
@@ -308,9 +348,12 @@ def is_split_before_delimiter(leaf: Leaf, previous: Optional[Leaf] = None) -> Pr
     ):
         return COMPARATOR_PRIORITY
 
+    return 0
+
+
+def _not_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
     if (
-        leaf.value == "not"
-        and leaf.parent
+        leaf.parent
         and leaf.parent.type == syms.comp_op
         and not (
             previous is not None
@@ -320,12 +363,38 @@ def is_split_before_delimiter(leaf: Leaf, previous: Optional[Leaf] = None) -> Pr
     ):
         return COMPARATOR_PRIORITY
 
-    if leaf.value in LOGIC_OPERATORS and leaf.parent:
+    return 0
+
+
+def _logic_priority(leaf: Leaf, previous: Optional[Leaf]) -> Priority:
+    if leaf.parent:
         return LOGIC_PRIORITY
 
     return 0
 
 
+# `is_split_before_delimiter` dispatches on the leaf type first and, for names,
+# on the keyword, so leaves that can never be delimiters exit after one lookup.
+_BEFORE_DELIMITER_BY_NAME: Final[dict[str, DelimiterHandler]] = {
+    "for": _for_priority,
+    "if": _if_priority,
+    "else": _else_priority,
+    "is": _comparator_priority,
+    "in": _in_priority,
+    "not": _not_priority,
+}
+_BEFORE_DELIMITER_BY_NAME.update({op: _logic_priority for op in LOGIC_OPERATORS})
+
+_BEFORE_DELIMITER_BY_TYPE: Final[dict[NodeType, DelimiterHandler]] = {
+    token.DOT: _dot_priority,
+    token.STRING: _string_priority,
+    token.NAME: _name_priority,
+    token.ASYNC: _async_priority,
+}
+_BEFORE_DELIMITER_BY_TYPE.update({t: _math_priority for t in MATH_OPERATORS})
+_BEFORE_DELIMITER_BY_TYPE.update({t: _comparator_priority for t in COMPARATORS})
+
+
 def max_delimiter_priority_in_atom(node: LN) -> Priority:
     """Return maximum delimiter priority inside `node`.
 
@@ -340,13 +409,19 @@ def max_delimiter_priority_in_atom(node: LN) -> Priority:
     if not (first.type == token.LPAR and last.type == token.RPAR):
         return 0
 
-    bt = BracketTracker()
+    leaves: list[Leaf] = []
     for c in node.children[1:-1]:
         if isinstance(c, Leaf):
-            bt.mark(c)
+            leaves.append(c)
         else:
-            for leaf in c.leaves():
-                bt.mark(leaf)
+            leaves.extend(c.leaves())
+    if not any(_may_be_delimiter(leaf) for leaf in leaves):
+        # Plenty of atoms are just a parenthesized name or call; skip tracking.
+        return 0
+
+    bt = BracketTracker()
+    for leaf in leaves:
+        bt.mark(leaf)
     try:
         return bt.max_delimiter_priority()
 
@@ -354,30 +429,48 @@ def max_delimiter_priority_in_atom(node: LN) -> Priority:
         return 0
 
 
+def _may_be_delimiter(leaf: Leaf) -> bool:
+    """Return False if `leaf` can never be a delimiter in a `BracketTracker`."""
+    if leaf.type == token.NAME:
+        return leaf.value in _BEFORE_DELIMITER_BY_NAME
+
+    return leaf.type == token.COMMA or leaf.type in _BEFORE_DELIMITER_BY_TYPE
+
+
 def get_leaves_inside_matching_brackets(leaves: Sequence[Leaf]) -> set[LeafID]:
     """Return leaves that are inside matching brackets.
 
     The input `leaves` can have non-matching brackets at the head or tail parts.
     Matching brackets are included.
     """
+    types = [leaf.type for leaf in leaves]
     try:
         # Start with the first opening bracket and ignore closing brackets before.
-        start_index = next(
-            i for i, l in enumerate(leaves) if l.type in OPENING_BRACKETS
-        )
+        start_index = next(i for i, t in enumerate(types) if t in OPENING_BRACKETS)
     except StopIteration:
         return set()
-    bracket_stack = []
-    ids = set()
-    for i in range(start_index, len(leaves)):
-        leaf = leaves[i]
-        if leaf.type in OPENING_BRACKETS:
-            bracket_stack.append((BRACKET[leaf.type], i))
-        if leaf.type in CLOSING_BRACKETS:
-            if bracket_stack and leaf.type == bracket_stack[-1][0]:
-                _, start = bracket_stack.pop()
-                for j in range(start, i + 1):
-                    ids.add(id(leaves[j]))
+    # Expected closing bracket types and opening indices, kept as parallel lists.
+    closing_types: list[NodeType] = []
+    opening_indices: list[int] = []
+    # Index ranges of matched bracket pairs. A newly closed pair contains every
+    # range recorded since its opening bracket, so those are dropped and the
+    # list stays sorted and non-overlapping.
+    ranges: list[tuple[int, int]] = []
+    for i in range(start_index, len(types)):
+        t = types[i]
+        if t in OPENING_BRACKETS:
+            closing_types.append(BRACKET[t])
+            opening_indices.append(i)
+        elif t in CLOSING_BRACKETS:
+            if closing_types and t == closing_types[-1]:
+                closing_types.pop()
+                start = opening_indices.pop()
+                while ranges and ranges[-1][0] > start:
+                    ranges.pop()
+                ranges.append((start, i))
             else:
                 break
+    ids: set[LeafID] = set()
+    for start, end in ranges:
+        ids.update(map(id, leaves[start : end + 1]))
     return ids
@@ -4,6 +4,7 @@
 chosen by the user.
 """
 
+from collections.abc import Collection
 from dataclasses import dataclass, field
 from enum import Enum, auto
 from hashlib import sha256
@@ -189,7 +190,9 @@ class Feature(Enum):
 }
 
 
-def supports_feature(target_versions: set[TargetVersion], feature: Feature) -> bool:
+def supports_feature(
+    target_versions: Collection[TargetVersion], feature: Feature
+) -> bool:
     return all(feature in VERSION_TO_FEATURES[version] for version in target_versions)
 
 
@@ -2,6 +2,8 @@
 Formatting numeric literals.
 """
 
+from functools import lru_cache
+
 from blib2to3.pytree import Leaf
 
 
@@ -9,13 +11,13 @@ def format_hex(text: str) -> str:
     """
     Formats a hexadecimal string like "0x12B3"
     """
-    before, after = text[:2], text[2:]
-    return f"{before}{after.upper()}"
+    return "0x" + text[2:].upper()
 
 
 def format_scientific_notation(text: str) -> str:
     """Formats a numeric string utilizing scientific notation"""
-    before, after = text.split("e")
+    exponent = text.find("e")
+    before, after = text[:exponent], text[exponent + 1 :]
     sign = ""
     if after.startswith("-"):
         after = after[1:]
@@ -35,10 +37,12 @@ def format_complex_number(text: str) -> str:
 
 def format_float_or_int_string(text: str) -> str:
     """Formats a float string like "1.0"."""
-    if "." not in text:
+    dot = text.find(".")
+    if dot < 0 or 0 < dot < len(text) - 1:
+        # No dot, or digits on both sides of it: nothing to add.
         return text
 
-    before, after = text.split(".")
+    before, after = text[:dot], text[dot + 1 :]
     return f"{before or 0}.{after or 0}"
 
 
@@ -46,16 +50,32 @@ def normalize_numeric_literal(leaf: Leaf) -> None:
     """Normalizes numeric (float, int, and complex) literals.
 
     All letters used in the representation are normalized to lowercase."""
-    text = leaf.value.lower()
-    if text.startswith(("0o", "0b")):
+    leaf.value = _normalize_numeric(leaf.value)
+
+
+# Numeric literals repeat a lot in real code (0, 1, 2, ...), so caching the
+# normalized text by value skips re-parsing the same literal over and over.
+@lru_cache(maxsize=4096)
+def _normalize_numeric(text: str) -> str:
+    if text.isdigit():
+        # Plain decimal integers are already normalized.
+        return text
+
+    # Only the first two characters are lowercased to detect the prefix.
+    prefix = text[:2].lower()
+    if prefix in ("0o", "0b"):
         # Leave octal and binary literals alone.
-        pass
-    elif text.startswith("0x"):
-        text = format_hex(text)
-    elif "e" in text:
+        return text.lower()
+
+    if prefix == "0x":
+        return format_hex(text)
+
+    if not text.islower():
+        text = text.lower()
+    if "e" in text:
         text = format_scientific_notation(text)
     elif text.endswith("j"):
         text = format_complex_number(text)
     else:
         text = format_float_or_int_string(text)
-    leaf.value = text
+    return text
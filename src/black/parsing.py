@@ -6,6 +6,8 @@
 import sys
 import warnings
 from collections.abc import Collection, Iterator
+from functools import lru_cache
+from typing import Final, Optional, Union
 
 from black.mode import VERSION_TO_FEATURES, Feature, TargetVersion, supports_feature
 from black.nodes import syms
@@ -21,17 +23,18 @@ class InvalidInput(ValueError):
     """Raised when input source code fails all parse attempts."""
 
 
-def get_grammars(target_versions: set[TargetVersion]) -> list[Grammar]:
+@lru_cache(maxsize=16)
+def get_grammars(target_versions: frozenset[TargetVersion]) -> tuple[Grammar, ...]:
     if not target_versions:
         # No target_version specified, so try all grammars.
-        return [
+        return (
             # Python 3.7-3.9
             pygram.python_grammar_async_keywords,
             # Python 3.0-3.6
             pygram.python_grammar,
             # Python 3.10+
             pygram.python_grammar_soft_keywords,
-        ]
+        )
 
     grammars = []
     # If we have to parse both, try to parse async as a keyword first
@@ -49,7 +52,14 @@ def get_grammars(target_versions: set[TargetVersion]) -> list[Grammar]:
 
     # At least one of the above branches must have been taken, because every Python
     # version has exactly one of the two 'ASYNC_*' flags
-    return grammars
+    return tuple(grammars)
+
+
+@lru_cache(maxsize=None)
+def _driver_for(grammar: Grammar) -> driver.Driver:
+    # Drivers only hold the grammar and a logger; all per-parse state lives in
+    # the parser created by each parse_string() call, so one can be shared.
+    return driver.Driver(grammar)
 
 
 def lib2to3_parse(
@@ -59,7 +69,7 @@ def lib2to3_parse(
     if not src_txt.endswith("\n"):
         src_txt += "\n"
 
-    grammars = get_grammars(set(target_versions))
+    grammars = get_grammars(frozenset(target_versions))
     if target_versions:
         max_tv = max(target_versions, key=lambda tv: tv.value)
         tv_str = f" for target version {max_tv.pretty()}"
@@ -68,7 +78,7 @@ def lib2to3_parse(
 
     errors = {}
     for grammar in grammars:
-        drv = driver.Driver(grammar)
+        drv = _driver_for(grammar)
         try:
             result = drv.parse_string(src_txt, True)
             break
@@ -103,7 +113,7 @@ def lib2to3_parse(
 
 
 def matches_grammar(src_txt: str, grammar: Grammar) -> bool:
-    drv = driver.Driver(grammar)
+    drv = _driver_for(grammar)
     try:
         drv.parse_string(src_txt, True)
     except (ParseError, TokenError, IndentationError):
@@ -122,6 +132,9 @@ class ASTSafetyError(Exception):
     """Raised when Black's generated code is not equivalent to the old AST."""
 
 
+# Not memoized on purpose: each source is parsed once per format, a cache keyed
+# on the source would pin every file and its AST in memory in long-running
+# processes, and stringify_ast mutates the nodes it walks.
 def _parse_single_version(
     src: str, version: tuple[int, int], *, type_comments: bool
 ) -> ast.AST:
@@ -146,8 +159,8 @@ def parse_ast(src: str) -> ast.AST:
             if not first_error:
                 first_error = str(e)
 
-    # Try to parse without type comments
-    for version in sorted(versions, reverse=True):
+        # Try to parse without type comments before falling back to an older
+        # version, so invalid type comments don't cost a parse per version
         try:
             return _parse_single_version(src, version, type_comments=False)
         except SyntaxError:
@@ -166,20 +179,49 @@ def _normalize(lineend: str, value: str) -> str:
     return normalized.strip()
 
 
-def stringify_ast(node: ast.AST) -> Iterator[str]:
-    """Simple visitor generating strings to compare ASTs by content."""
-    return _stringify_ast(node, [])
+_INDENTS: Final = tuple("    " * depth for depth in range(128))
+
+
+def _indent(depth: int) -> str:
+    if depth < len(_INDENTS):
+        return _INDENTS[depth]
+
+    return "    " * depth
+
 
+_SORTED_FIELDS: Final[dict[type[ast.AST], tuple[str, ...]]] = {}
 
-def _stringify_ast_with_new_parent(
-    node: ast.AST, parent_stack: list[ast.AST], new_parent: ast.AST
-) -> Iterator[str]:
-    parent_stack.append(new_parent)
-    yield from _stringify_ast(node, parent_stack)
-    parent_stack.pop()
 
+def _sorted_fields(node: ast.AST) -> tuple[str, ...]:
+    node_type = type(node)
+    fields = _SORTED_FIELDS.get(node_type)
+    if fields is None:
+        fields = _SORTED_FIELDS[node_type] = tuple(sorted(node._fields))
+    return fields
 
-def _stringify_ast(node: ast.AST, parent_stack: list[ast.AST]) -> Iterator[str]:
+
+_StringifyItem = Union[str, tuple[ast.AST, int, Optional[ast.AST]]]
+
+
+def stringify_ast(node: ast.AST) -> Iterator[str]:
+    """Simple visitor generating strings to compare ASTs by content."""
+    # The tree is walked with an explicit stack rather than nested generators.
+    # Entries are either finished lines or nodes still to be expanded, along
+    # with their depth and parent.
+    stack: list[_StringifyItem] = [(node, 0, None)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+        else:
+            items = _stringify_node(*item)
+            items.reverse()
+            stack.extend(items)
+
+
+def _stringify_node(
+    node: ast.AST, depth: int, parent: Optional[ast.AST]
+) -> list[_StringifyItem]:
     if (
         isinstance(node, ast.Constant)
         and isinstance(node.value, str)
@@ -190,9 +232,11 @@ def _stringify_ast(node: ast.AST, parent_stack: list[ast.AST]) -> Iterator[str]:
         # over the kind
         node.kind = None
 
-    yield f"{'    ' * len(parent_stack)}{node.__class__.__name__}("
+    indent = _indent(depth)
+    child_indent = _indent(depth + 1)
+    items: list[_StringifyItem] = [f"{indent}{node.__class__.__name__}("]
 
-    for field in sorted(node._fields):  # noqa: F402
+    for field in _sorted_fields(node):  # noqa: F402
         # TypeIgnore has only one field 'lineno' which breaks this comparison
         if isinstance(node, ast.TypeIgnore):
             break
@@ -202,7 +246,7 @@ def _stringify_ast(node: ast.AST, parent_stack: list[ast.AST]) -> Iterator[str]:
         except AttributeError:
             continue
 
-        yield f"{'    ' * (len(parent_stack) + 1)}{field}="
+        items.append(f"{child_indent}{field}=")
 
         if isinstance(value, list):
             for item in value:
@@ -214,15 +258,13 @@ def _stringify_ast(node: ast.AST, parent_stack: list[ast.AST]) -> Iterator[str]:
                     and isinstance(item, ast.Tuple)
                 ):
                     for elt in item.elts:
-                        yield from _stringify_ast_with_new_parent(
-                            elt, parent_stack, node
-                        )
+                        items.append((elt, depth + 1, node))
 
                 elif isinstance(item, ast.AST):
-                    yield from _stringify_ast_with_new_parent(item, parent_stack, node)
+                    items.append((item, depth + 1, node))
 
         elif isinstance(value, ast.AST):
-            yield from _stringify_ast_with_new_parent(value, parent_stack, node)
+            items.append((value, depth + 1, node))
 
         else:
             normalized: object
@@ -230,10 +272,10 @@ def _stringify_ast(node: ast.AST, parent_stack: list[ast.AST]) -> Iterator[str]:
                 isinstance(node, ast.Constant)
                 and field == "value"
                 and isinstance(value, str)
-                and len(parent_stack) >= 2
+                and depth >= 2
                 # Any standalone string, ideally this would
                 # exactly match black.nodes.is_docstring
-                and isinstance(parent_stack[-1], ast.Expr)
+                and isinstance(parent, ast.Expr)
             ):
                 # Constant strings may be indented across newlines, if they are
                 # docstrings; fold spaces after newlines when comparing. Similarly,
@@ -244,9 +286,7 @@ def _stringify_ast(node: ast.AST, parent_stack: list[ast.AST]) -> Iterator[str]:
                 normalized = value.rstrip()
             else:
                 normalized = value
-            yield (
-                f"{'    ' * (len(parent_stack) + 1)}{normalized!r},  #"
-                f" {value.__class__.__name__}"
-            )
+            items.append(f"{child_indent}{normalized!r},  # {value.__class__.__name__}")
 
-    yield f"{'    ' * len(parent_stack)})  # /{node.__class__.__name__}"
+    items.append(f"{indent})  # /{node.__class__.__name__}")
+    return items
@@ -4,6 +4,7 @@
 """Safely evaluate Python string literals without using eval()."""
 
 import re
+from typing import Optional
 
 simple_escapes: dict[str, str] = {
     "a": "\a",
@@ -18,14 +19,22 @@
     "\\": "\\",
 }
 
+# Simple escapes indexed by the code point of the escaped character. Every
+# single-character escape the regex below can match is ASCII.
+_ESCAPE_TABLE: tuple[Optional[str], ...] = tuple(
+    simple_escapes.get(chr(i)) for i in range(128)
+)
+_ESCAPE_RE = re.compile(r"\\(\'|\"|\\|[abfnrtv]|x.{0,2}|[0-7]{1,3})")
+
 
 def escape(m: re.Match[str]) -> str:
     all, tail = m.group(0, 1)
     assert all.startswith("\\")
-    esc = simple_escapes.get(tail)
-    if esc is not None:
-        return esc
-    if tail.startswith("x"):
+    if len(tail) == 1:
+        esc = _ESCAPE_TABLE[ord(tail)]
+        if esc is not None:
+            return esc
+    if tail[0] == "x":
         hexes = tail[1:]
         if len(hexes) < 2:
             raise ValueError("invalid hex string escape ('\\%s')" % tail)
@@ -49,7 +58,9 @@ def evalString(s: str) -> str:
     assert s.endswith(q), repr(s[-len(q) :])
     assert len(s) >= 2 * len(q)
     s = s[len(q) : -len(q)]
-    return re.sub(r"\\(\'|\"|\\|[abfnrtv]|x.{0,2}|[0-7]{1,3})", escape, s)
+    if "\\" not in s:
+        return s
+    return _ESCAPE_RE.sub(escape, s)
 
 
 def test() -> None:
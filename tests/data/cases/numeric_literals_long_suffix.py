@@ -0,0 +1,13 @@
+# flags: --fast
+# Python 2 long literals are not valid Python 3, but the tokenizer still accepts
+# the suffix on hex and octal numbers.
+x = 0O17L
+x = 0XABl
+x = 0xabL
+
+# output
+# Python 2 long literals are not valid Python 3, but the tokenizer still accepts
+# the suffix on hex and octal numbers.
+x = 0o17l
+x = 0xABL
+x = 0xABL